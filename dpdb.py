@@ -271,6 +271,269 @@ The result of the last statement is the result of the query:
     >>> "id" in result[0] and isinstance(result[0]["id"], int)
     True
 
+Bulk Loading
+============
+Large CSV and JSONL files can be loaded through a single-statement query
+using `bulk_load`. It takes the name of the query, the file to load, and
+a mapping from the file's columns (CSV header names or JSON keys) to the
+query's parameters. Optional converters are applied to column values:
+
+    >>> import os, tempfile
+    >>> db.add_query("load_user", "INSERT INTO users(name, password) VALUES(${name}, ${password})")
+    >>> db.commit()
+    >>> fd, path = tempfile.mkstemp(suffix=".csv")
+    >>> with os.fdopen(fd, "w") as fp:
+    ...     result = fp.write("login,secret\\nbgordon,oracle\\nhjordan,ring\\n")
+    >>> loaded = db.bulk_load("load_user", path, {"login": "name", "secret": "password"},
+    ...                       converters={"secret": lambda v: v.upper()})
+    >>> loaded.rows, loaded.position
+    (2, 2)
+    >>> [u["password"] for u in db.list_users() if u["name"] in ("bgordon", "hjordan")] == ["ORACLE", "RING"]
+    True
+
+The file is read in a background thread, so decoding and converting
+records overlaps with writing earlier chunks with `executemany`. Passing
+`workers` greater than one spreads the decoding and conversion of each
+chunk of `chunk_size` records across that many processes, which helps
+when that work is CPU-bound and more than one CPU is available; the
+converters must then be picklable (builtins or module-level functions,
+not lambdas). CSV records are still split into fields by the reading
+thread, since quoted fields can span lines, so for CSV files only the
+conversion is done in parallel. The load is committed every `commit_every` rows; after
+each commit the optional `progress` callback receives a `LoadProgress`
+object describing the number of rows loaded, the elapsed time, the
+throughput (`rate`, in rows per second) and the `position` in the file.
+Passing that position back in as `start` resumes an interrupted load
+from its last commit:
+
+    >>> with open(path, "a") as fp:
+    ...     result = fp.write("sshiera,hawkwing\\n")
+    >>> loaded = db.bulk_load("load_user", path, {"login": "name", "secret": "password"}, start=2)
+    >>> loaded.rows, loaded.position
+    (1, 3)
+    >>> os.remove(path)
+
+JSONL files work the same way. Here the load is committed in several
+batches, and the progress callback is called after each of them:
+
+    >>> fd, path = tempfile.mkstemp(suffix=".jsonl")
+    >>> with os.fdopen(fd, "w") as fp:
+    ...     for i in range(7):
+    ...         result = fp.write('{"login": "robin%d", "secret": "pw%d"}\\n' % (i, i))
+    >>> positions = []
+    >>> loaded = db.bulk_load("load_user", path, {"login": "name", "secret": "password"},
+    ...                       chunk_size=2, commit_every=3, workers=2, progress=lambda p: positions.append(p.position))
+    >>> positions, loaded.rows
+    ([4, 7], 7)
+    >>> os.remove(path)
+
+If the load fails, the rows since the last commit are rolled back and
+the error is raised. The load can then be resumed from the last reported
+position:
+
+    >>> fd, path = tempfile.mkstemp(suffix=".jsonl")
+    >>> with os.fdopen(fd, "w") as fp:
+    ...     for i in range(7):
+    ...         result = fp.write('{"login": "nwing%d", "secret": "%s"}\\n' % (i, "five" if i == 5 else i))
+    >>> positions = []
+    >>> try:
+    ...     loaded = db.bulk_load("load_user", path, {"login": "name", "secret": "password"}, {"secret": int},
+    ...                           chunk_size=2, commit_every=2, workers=2, progress=lambda p: positions.append(p.position))
+    ... except ValueError:
+    ...     print("load failed")
+    load failed
+    >>> positions
+    [2, 4]
+    >>> len([u for u in db.list_users() if u["name"].startswith("nwing")])
+    4
+    >>> loaded = db.bulk_load("load_user", path, {"login": "name", "secret": "password"}, start=positions[-1])
+    >>> loaded.rows, loaded.position
+    (3, 7)
+    >>> len([u for u in db.list_users() if u["name"].startswith("nwing")])
+    7
+
+A load will not start while other work is uncommitted on the connection,
+since its commits and rollbacks would take that work along with them:
+
+    >>> result = db.load_user(name="afleck", password="affleck")
+    >>> db.bulk_load("load_user", path, {"login": "name", "secret": "password"})
+    Traceback (most recent call last):
+        ...
+    ValueError: cannot bulk load with uncommitted work pending
+    >>> db.rollback()
+    >>> db.bulk_load("load_user", path, {"login": "name", "secret": "password"}, chunk_size=0)
+    Traceback (most recent call last):
+        ...
+    ValueError: invalid chunk_size '0'; must be at least 1
+    >>> os.remove(path)
+
+Retrying Under Contention
+=========================
+When several connections write to the same database, queries and
+transactions can fail because another connection holds a lock (for
+example, SQLite's "database is locked" or PostgreSQL's serialization
+failures). A `RetryPolicy` can be passed to the Database to retry these
+failures with jittered exponential backoff. The policy recognizes the
+retryable errors of the sqlite3, psycopg2, psycopg, MySQLdb, pymysql and
+mysql.connector modules; a `retryable` function taking the module and
+the error can be given to recognize additional errors.
+
+Outside of a transaction, a query that fails with a retryable error is
+rolled back and called again if nothing else was pending on the
+connection, up to `attempts` times in total, sleeping for a random time
+of up to `delay * multiplier ** n` seconds (but never more than
+`maximum`) between attempts. After the last attempt the error is raised
+to the caller:
+
+    >>> fd, path = tempfile.mkstemp(suffix=".db")
+    >>> os.close(fd)
+    >>> holder = sqlite3.connect(path, check_same_thread=False)
+    >>> result = holder.execute(config2["QUERIES"]["create_table"])
+    >>> holder.commit()
+    >>> result = holder.execute("BEGIN EXCLUSIVE")
+    >>> policy = RetryPolicy(attempts=3, delay=0.001)
+    >>> db = Database(config2, handle=sqlite3.connect(path, timeout=0), module=sqlite3, retry=policy)
+    >>> try:
+    ...     result = db.create_user(name="bwayne", password="iamthenight")
+    ... except sqlite3.OperationalError:
+    ...     print("gave up")
+    gave up
+    >>> policy.retries, policy.giveups
+    (2, 1)
+
+If the lock is released in time, the query succeeds. Reading from the
+database does not leave anything pending, so a write that follows a read
+is still retried:
+
+    >>> import threading
+    >>> policy = RetryPolicy(attempts=100, delay=0.001)
+    >>> db.retry = policy
+    >>> releaser = threading.Timer(0.05, holder.rollback)
+    >>> releaser.start()
+    >>> db.list_users()
+    []
+    >>> result = db.create_user(name="bwayne", password="iamthenight")
+    >>> releaser.join()
+    >>> policy.retries > 0, policy.giveups
+    (True, 0)
+    >>> db.commit()
+
+A query is not retried if earlier work is still uncommitted on the
+connection, since rolling back would silently throw that work away.
+The error is raised instead, and the earlier work is left in place.
+Where the driver's connection has an `in_transaction` attribute (as
+sqlite3's does), it decides whether work is pending; otherwise, any query
+since the last commit or rollback counts as pending:
+
+    >>> policy = RetryPolicy(attempts=3, delay=0.001, retryable=lambda module, error: "no such table" in str(error))
+    >>> db.retry = policy
+    >>> db.add_query("broken", "SELECT * FROM villains")
+    >>> result = db.create_user(name="jgordon", password="mustache")
+    >>> try:
+    ...     result = db.broken()
+    ... except sqlite3.OperationalError:
+    ...     print("not retried")
+    not retried
+    >>> policy.retries
+    0
+    >>> db.commit()
+    >>> try:
+    ...     result = db.broken()
+    ... except sqlite3.OperationalError:
+    ...     print("gave up")
+    gave up
+    >>> policy.retries, policy.giveups
+    (2, 1)
+    >>> [u["name"] for u in db.list_users()] == ["bwayne", "jgordon"]
+    True
+
+Queries called inside a transaction are not retried on their own either.
+Instead, `Transaction.run` calls a function within the transaction and
+re-runs the whole thing when it fails with a retryable error. As with
+single queries, this only happens if nothing was pending when `run` was
+called:
+
+    >>> calls = []
+    >>> def add_users():
+    ...     calls.append(None)
+    ...     result = db.create_user(name="skyle", password="meow")
+    ...     if len(calls) == 1:
+    ...         raise sqlite3.OperationalError("database is locked")
+    ...     result = db.create_user(name="hquinn", password="puddin")
+    >>> policy.reset()
+    >>> Transaction(db).run(add_users)
+    >>> len(calls), policy.retries, policy.giveups
+    (2, 1, 0)
+    >>> [u["name"] for u in db.list_users()] == ["bwayne", "hquinn", "jgordon", "skyle"]
+    True
+    >>> calls = []
+    >>> def add_sidekick():
+    ...     calls.append(None)
+    ...     raise sqlite3.OperationalError("database is locked")
+    >>> result = db.create_user(name="jtodd", password="redhood")
+    >>> try:
+    ...     Transaction(db).run(add_sidekick)
+    ... except sqlite3.OperationalError:
+    ...     print("not retried")
+    not retried
+    >>> len(calls), policy.retries
+    (1, 1)
+
+Only the outermost transaction is retried; a nested `Transaction.run`
+calls its function once and lets the outer transaction start over:
+
+    >>> outer_calls, inner_calls = [], []
+    >>> def inner():
+    ...     inner_calls.append(None)
+    ...     result = db.create_user(name="pivy", password="roses")
+    ...     if len(inner_calls) == 1:
+    ...         raise sqlite3.OperationalError("database is locked")
+    >>> def outer():
+    ...     outer_calls.append(None)
+    ...     result = db.create_user(name="ecobblepot", password="umbrella")
+    ...     Transaction(db).run(inner)
+    >>> policy.reset()
+    >>> Transaction(db).run(outer)
+    >>> len(outer_calls), len(inner_calls), policy.retries
+    (2, 2, 1)
+    >>> len(db.list_users())
+    6
+
+The checks for each driver look at the error's SQLSTATE or error number:
+
+    >>> class FakeError(Exception):
+    ...     pass
+    >>> error = FakeError("deadlock detected")
+    >>> error.pgcode = "40P01"
+    >>> postgresql_is_retryable(None, error)
+    True
+    >>> error = FakeError("could not serialize access")
+    >>> error.sqlstate = "40001"
+    >>> postgresql_is_retryable(None, error)
+    True
+    >>> mysql_is_retryable(None, FakeError(1213, "Deadlock found when trying to get lock"))
+    True
+    >>> error = FakeError("Lock wait timeout exceeded")
+    >>> error.errno = 1205
+    >>> mysql_is_retryable(None, error)
+    True
+    >>> mysql_is_retryable(None, FakeError(1062, "Duplicate entry"))
+    False
+    >>> class psycopg2:
+    ...     Error = FakeError
+    >>> RetryPolicy().is_retryable(psycopg2, FakeError("unique violation"))
+    False
+
+The policy's `retries`, `giveups` and `contention` (the number of seconds
+spent in failed attempts and backing off) counters can be used to measure
+and tune throughput under contention. A single policy can be shared by
+several Database objects to collect their counters together, and `reset`
+sets the counters back to zero.
+
+    >>> db.close()
+    >>> holder.close()
+    >>> os.remove(path)
+
 Extended ConfigParser Format
 ============================
 Python 3.x ConfigParser objects can be used "naturally", since they conform
@@ -368,7 +631,7 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 
-__all__ = ["Database", "Transaction"]
+__all__ = ["Database", "LoadProgress", "RetryPolicy", "Transaction"]
 __author__ = "Rob King"
 __copyright__ = "Copyright (C) 2015-2017 Rob King"
 __license__ = "LGPL"
@@ -377,8 +640,18 @@ __email__ = "jking@deadpixi.com"
 __status__ = "Alpha"
 
 import collections
+import csv
+import itertools
+import json
+import os
+import random
 import re
 import string
+import sys
+import threading
+import time
+
+from multiprocessing import Pool
 
 try:
     import importlib
@@ -400,6 +673,12 @@ try:
 except ImportError:
     from configparser import RawConfigParser
 
+try:
+    import Queue as queue
+
+except ImportError:
+    import queue
+
 try:
     from StringIO import StringIO
 
@@ -419,6 +698,15 @@ class Query:
         self.parameters = parameters
 
     def __call__(self, *args, **kwargs):
+        # Rolling back to retry is only safe if nothing else is pending on
+        # the connection; otherwise, leave recovery to Transaction.run.
+        policy = self.database.retry
+        if policy is None or self.database._transaction > 0 or self.database._pending():
+            return self._execute(args, kwargs)
+
+        return policy.run(self.database.module, lambda: self._execute(args, kwargs), self.database.rollback)
+
+    def _execute(self, args, kwargs):
         results = []
         for query in self.queries:
             mapping = self.database.mapping(kwargs)
@@ -426,6 +714,7 @@ class Query:
             mapping.update((k, v) for k, v in zip(self.parameters, args))
 
             query = string.Template(query % kwargs).substitute(mapping)
+            self.database._dirty = True
             self.database.cursor.execute(query, mapping.get_parameters())
 
             try:
@@ -496,23 +785,153 @@ def dict_of_config(parser):
 
     return config
 
+def open_csv(filename):
+    # The csv module wants files opened in binary mode on Python 2 and
+    # with universal newlines disabled on Python 3.
+    if sys.version_info[0] < 3:
+        return open(filename, "rb")
+    return open(filename, "r", newline="")
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def convert_records(records, header, keys, fields):
+    # Runs in the bulk loader's worker processes, so it lives at module level
+    # and takes everything it needs as arguments.
+    rows = []
+    for record in records:
+        if header is None:
+            record = json.loads(record)
+
+        else:
+            record = dict(zip(header, record))
+
+        values = [record[c] if f is None else f(record[c]) for c, f in fields]
+        rows.append(values if keys is None else dict(zip(keys, values)))
+
+    return rows
+
+def sqlite_is_retryable(module, error):
+    message = str(error).lower()
+    return isinstance(error, module.OperationalError) and ("locked" in message or "busy" in message)
+
+def postgresql_is_retryable(module, error):
+    # serialization_failure, deadlock_detected, lock_not_available
+    code = getattr(error, "pgcode", None) or getattr(error, "sqlstate", None)
+    return code in ("40001", "40P01", "55P03")
+
+def mysql_is_retryable(module, error):
+    # ER_LOCK_WAIT_TIMEOUT, ER_LOCK_DEADLOCK
+    code = getattr(error, "errno", None) or (error.args[0] if error.args else None)
+    return code in (1205, 1213)
+
+retryable_errors = {
+    "sqlite3": sqlite_is_retryable,
+    "sqlite3.dbapi2": sqlite_is_retryable,
+    "pysqlite2.dbapi2": sqlite_is_retryable,
+    "psycopg2": postgresql_is_retryable,
+    "psycopg": postgresql_is_retryable,
+    "MySQLdb": mysql_is_retryable,
+    "pymysql": mysql_is_retryable,
+    "mysql.connector": mysql_is_retryable
+}
+
+class RetryPolicy:
+    """
+    A policy for retrying queries and transactions that fail due to lock contention.
+    """
+
+    def __init__(self, attempts=5, delay=0.01, maximum=1.0, multiplier=2.0, retryable=None):
+        self.attempts = attempts
+        self.delay = delay
+        self.maximum = maximum
+        self.multiplier = multiplier
+        self.retryable = retryable
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.retries = 0
+            self.giveups = 0
+            self.contention = 0.0
+
+    def is_retryable(self, module, error):
+        check = retryable_errors.get(getattr(module, "__name__", None))
+        if check is not None and check(module, error):
+            return True
+
+        return self.retryable is not None and self.retryable(module, error)
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.maximum, self.delay * self.multiplier ** attempt))
+
+    def run(self, module, function, rollback=None):
+        attempt = 0
+        while True:
+            started = time.time()
+            try:
+                return function()
+
+            except module.Error as e:
+                if not self.is_retryable(module, e):
+                    raise
+
+                if rollback is not None:
+                    rollback()
+
+                attempt += 1
+                if attempt >= self.attempts:
+                    with self._lock:
+                        self.giveups += 1
+                        self.contention += time.time() - started
+                    raise
+
+                delay = self.backoff(attempt - 1)
+                with self._lock:
+                    self.retries += 1
+                    self.contention += time.time() - started + delay
+                time.sleep(delay)
+
+class LoadProgress:
+    """
+    The progress of a bulk load, as reported by `Database.bulk_load`.
+    """
+
+    def __init__(self, rows, chunks, position, elapsed):
+        self.rows = rows
+        self.chunks = chunks
+        self.position = position
+        self.elapsed = elapsed
+
+    @property
+    def rate(self):
+        if self.elapsed <= 0:
+            return 0.0
+        return self.rows / float(self.elapsed)
+
 class Database:
     """
     A database connection.
     """
 
     @classmethod
-    def from_config_file(self, config_file, row_factory=default_row_factory, handle=None, module=None, **parameters):
+    def from_config_file(self, config_file, row_factory=default_row_factory, handle=None, module=None, retry=None, **parameters):
         with open(config_file, "r") as fp:
-            return self.from_config(fp.read(), row_factory, handle, module, **parameters)
+            return self.from_config(fp.read(), row_factory, handle, module, retry, **parameters)
 
     @classmethod
-    def from_config(self, config, row_factory=default_row_factory, handle=None, module=None, **parameters):
+    def from_config(self, config, row_factory=default_row_factory, handle=None, module=None, retry=None, **parameters):
         s = StringIO(config)
         parser = RawConfigParser()
         parser.readfp(s)
 
-        db = Database(dict_of_config(parser), row_factory, handle, module, **parameters)
+        db = Database(dict_of_config(parser), row_factory, handle, module, retry, **parameters)
         db.load_queries_from_config(config)
         return db
 
@@ -536,7 +955,7 @@ class Database:
                 statements = [s[1] for s in sorted(contents.items()) if s[0].startswith("statement")]
                 self.add_query(section[len("QUERY "):], statements, args)
 
-    def __init__(self, config, row_factory=default_row_factory, handle=None, module=None, **parameters):
+    def __init__(self, config, row_factory=default_row_factory, handle=None, module=None, retry=None, **parameters):
         if not isinstance(config, collections.Mapping):
             raise TypeError("config must be a mapping")
 
@@ -589,7 +1008,18 @@ class Database:
 
         self.cursor = self.db.cursor()
         self.row_factory = row_factory
+        self.retry = retry
         self._transaction = 0
+        self._dirty = False
+
+    def _pending(self):
+        # Trust the driver's own idea of whether a transaction is open if it
+        # has one; otherwise assume any query since the last commit or
+        # rollback left work behind.
+        in_transaction = getattr(self.db, "in_transaction", None)
+        if in_transaction is not None:
+            return in_transaction
+        return self._dirty
 
     def _enter_transaction(self):
         self._transaction += 1
@@ -601,9 +1031,11 @@ class Database:
         if rollback:
             if hasattr(self.db, "rollback"):
                 self.db.rollback()
+            self._dirty = False
 
         elif self._transaction <= 0:
             self.db.commit()
+            self._dirty = False
 
     def __getattr__(self, attr):
         if attr not in self.queries:
@@ -638,13 +1070,165 @@ class Database:
 
         self.queries[name] = Query(statements, self, parameters)
 
+    def bulk_load(self, query_name, filename, columns, converters=None, format=None,
+                  chunk_size=1000, commit_every=10000, workers=1, start=0, progress=None, **kwargs):
+        """
+        Load the records of a CSV or JSONL file using the named query.
+
+        `columns` maps CSV header names or JSON keys to query parameter names,
+        and `converters` optionally maps those same columns to functions
+        applied to their values. The file is read in chunks of `chunk_size`
+        records, which are decoded and converted by a pool of `workers`
+        processes (or by the reading thread itself if `workers` is 1) while
+        earlier chunks are written with `executemany`. The load is committed
+        every `commit_every` rows; after each commit, `progress` is called
+        with a `LoadProgress` whose `position` can be passed back in as
+        `start` to resume an interrupted load. Any other keyword arguments
+        are used for unsafe substitutions.
+        """
+
+        assert self._transaction == 0
+
+        if self._pending():
+            raise ValueError("cannot bulk load with uncommitted work pending")
+
+        for name, value in (("chunk_size", chunk_size), ("commit_every", commit_every), ("workers", workers)):
+            if value < 1:
+                raise ValueError("invalid %s '%s'; must be at least 1" % (name, value))
+
+        if query_name not in self.queries:
+            raise ValueError("unknown query '%s'" % query_name)
+
+        statements = self.queries[query_name].queries
+        if len(statements) != 1:
+            raise ValueError("bulk loading requires a single-statement query")
+
+        if format is None:
+            format = os.path.splitext(filename)[1].lstrip(".").lower()
+
+        if format not in ("csv", "jsonl"):
+            raise ValueError("unsupported bulk load format '%s'" % format)
+
+        converters = converters or {}
+
+        # Bind each parameter to its own name once; the resulting parameters
+        # tell us how to lay out the values of every record.
+        mapping = self.mapping(dict((v, v) for v in columns.values()))
+        query = string.Template(statements[0] % kwargs).substitute(mapping)
+        names = mapping.get_parameters()
+
+        keys = None
+        if isinstance(names, dict):
+            keys = list(names.keys())
+            names = [names[k] for k in keys]
+
+        parameters = dict((v, k) for k, v in columns.items())
+        fields = [(parameters[n], converters.get(parameters[n])) for n in names]
+
+        chunks = queue.Queue(workers * 2)
+        stop = threading.Event()
+        failure = []
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    chunks.put(item, timeout=0.1)
+                    return True
+
+                except queue.Full:
+                    continue
+
+            return False
+
+        def produce():
+            try:
+                for chunk in chunked(itertools.islice(records, start, None), chunk_size):
+                    if pool is None:
+                        item = convert_records(chunk, header, keys, fields)
+
+                    else:
+                        item = pool.apply_async(convert_records, (chunk, header, keys, fields))
+
+                    if not put(item):
+                        return
+
+            except Exception as e:
+                failure.append(e)
+
+            put(None)
+
+        with (open_csv(filename) if format == "csv" else open(filename, "r")) as fp:
+            if format == "csv":
+                # Quoted fields can span lines, so CSV records are split by
+                # the reading thread; only their conversion is parallel.
+                reader = csv.reader(fp)
+                header = next(reader, [])
+                records = reader
+
+            else:
+                header = None
+                records = (line for line in fp if line.strip())
+
+            producer = threading.Thread(target=produce)
+            producer.daemon = True
+
+            started = time.time()
+            state = {"rows": 0, "chunks": 0, "pending": 0}
+
+            def checkpoint():
+                self.db.commit()
+                self._dirty = False
+                committed = state["pending"]
+                state["rows"] += committed
+                state["pending"] = 0
+                report = LoadProgress(state["rows"], state["chunks"], start + state["rows"], time.time() - started)
+                if progress is not None and committed:
+                    progress(report)
+                return report
+
+            pool = Pool(workers) if workers > 1 else None
+            try:
+                producer.start()
+                while True:
+                    result = chunks.get()
+                    if result is None:
+                        break
+
+                    rows = result if pool is None else result.get()
+                    self.cursor.executemany(query, rows)
+                    state["chunks"] += 1
+                    state["pending"] += len(rows)
+                    if state["pending"] >= commit_every:
+                        checkpoint()
+
+                if failure:
+                    raise failure[0]
+
+                return checkpoint()
+
+            except:
+                if hasattr(self.db, "rollback"):
+                    self.db.rollback()
+                self._dirty = False
+                raise
+
+            finally:
+                stop.set()
+                if producer.is_alive():
+                    producer.join()
+                if pool is not None:
+                    pool.terminate()
+                    pool.join()
+
     def commit(self):
         assert self._transaction == 0
         self.db.commit()
+        self._dirty = False
 
     def rollback(self):
         assert self._transaction == 0
         self.db.rollback()
+        self._dirty = False
 
     def close(self):
         self.db.close()
@@ -664,6 +1248,24 @@ class Transaction:
     def __exit__(self, exc_type, exec_value, traceback):
         self._db._exit_transaction(exc_type is not None)
 
+    def run(self, function, *args, **kwargs):
+        """
+        Call `function` within this transaction. If the database has a retry
+        policy, this is the outermost transaction and nothing else is pending
+        on the connection, the whole call is rolled back and re-run when it
+        fails with a retryable error.
+        """
+
+        def attempt():
+            with self:
+                return function(*args, **kwargs)
+
+        policy = self._db.retry
+        if policy is None or self._db._transaction > 0 or self._db._pending():
+            return attempt()
+
+        return policy.run(self._db.module, attempt, self._db.rollback)
+
 if __name__ == "__main__":
     import doctest
     doctest.testmod()